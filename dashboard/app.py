@@ -1,22 +1,106 @@
-import matplotlib.pyplot as plt
+import io
+import os
+
 import pandas as pd
 import seaborn as sns
 import streamlit as st
+from matplotlib.figure import Figure
 
 st.set_page_config(page_title="Goodreads Dashboard", layout="wide")
 
 
-@st.cache_data
-def load_data():
-    df = pd.read_csv("../data/db.csv")
-    df["genres_list"] = df["genres"].apply(
-        lambda x: [g.strip() for g in str(x).split(",")]
-    )
-    df["n_genres"] = df["genres_list"].apply(len)
+CACHE_TTL = 3600
+DATA_PATH = (
+    "../data/db.parquet" if os.path.exists("../data/db.parquet") else "../data/db.csv"
+)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def load_data(path, mtime):
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path, engine="pyarrow")
+        df["genres_list"] = df["genres"]
+        df["genres"] = df["genres_list"].str.join(", ").mask(
+            df["genres_list"].str.len() == 0
+        )
+    else:
+        df = pd.read_csv(path)
+        df["genres_list"] = df["genres"].fillna("").str.findall(
+            r"[^,\s](?:[^,]*[^,\s])?"
+        )
+    df["n_genres"] = df["genres_list"].str.len()
+    df["author"] = df["author"].astype("category")
     return df
 
 
-df = load_data()
+@st.cache_data(ttl=CACHE_TTL)
+def top_genres(df):
+    return df["genres_list"].explode().str.strip().value_counts(sort=False).nlargest(15)
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def corr_matrix(df):
+    return df[["rating", "pages", "ratings_count", "n_genres"]].corr()
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def author_leaderboard(df):
+    return (
+        df.groupby("author", observed=True)
+        .agg(n_books=("title", "count"), avg_rating=("rating", "mean"))
+        .query("n_books >= 3")
+        .sort_values("avg_rating", ascending=False)
+        .head(15)
+    )
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def summary_stats(df):
+    return len(df), int(df.isna().to_numpy().sum()), float(df["n_genres"].mean())
+
+
+def figure_to_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100, bbox_inches="tight")
+    return buf.getvalue()
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def render_top_genres_png(df):
+    genre_counts = top_genres(df)
+    fig = Figure()
+    ax = fig.subplots()
+    sns.barplot(x=genre_counts.values, y=genre_counts.index, ax=ax)
+    ax.set_xlabel("Число книг")
+    ax.set_title("Топ-15 жанров")
+    return figure_to_png(fig)
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def render_rating_hist_png(df):
+    fig = Figure()
+    ax = fig.subplots()
+    sns.histplot(df["rating"], bins=20, kde=True, ax=ax)
+    return figure_to_png(fig)
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def render_pages_hist_png(df):
+    fig = Figure()
+    ax = fig.subplots()
+    sns.histplot(df["pages"].dropna(), bins=20, ax=ax)
+    return figure_to_png(fig)
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def render_corr_heatmap_png(df):
+    fig = Figure()
+    ax = fig.subplots()
+    sns.heatmap(corr_matrix(df), annot=True, cmap="coolwarm", fmt=".2f", ax=ax)
+    return figure_to_png(fig)
+
+
+df = load_data(DATA_PATH, os.path.getmtime(DATA_PATH))
 
 st.sidebar.title("Навигация")
 page = st.sidebar.radio(
@@ -37,56 +121,31 @@ elif page == "Данные":
     st.dataframe(df)
 
     st.subheader("Счётчики")
+    n_books, n_missing, mean_genres = summary_stats(df)
     col1, col2, col3 = st.columns(3)
-    col1.metric("Кол-во книг", len(df))
-    col2.metric("Пропусков", df.isnull().sum().sum())
-    col3.metric("Среднее число жанров", f"{df['n_genres'].mean():.2f}")
+    col1.metric("Кол-во книг", n_books)
+    col2.metric("Пропусков", n_missing)
+    col3.metric("Среднее число жанров", f"{mean_genres:.2f}")
 
     st.subheader("Распределение жанров по книгам")
-    genre_counts = {}
-    for genre_list in df["genres_list"]:
-        for g in genre_list:
-            genre_counts[g] = genre_counts.get(g, 0) + 1
-    genre_df = (
-        pd.DataFrame.from_dict(genre_counts, orient="index", columns=["count"])
-        .sort_values(by="count", ascending=False)
-        .head(15)
-    )
-    fig, ax = plt.subplots()
-    sns.barplot(x=genre_df["count"], y=genre_df.index, ax=ax)
-    ax.set_xlabel("Число книг")
-    ax.set_title("Топ-15 жанров")
-    st.pyplot(fig)
+    st.image(render_top_genres_png(df), width="stretch")
 
 elif page == "EDA":
     st.header("Первичный анализ")
     st.subheader("Распределение рейтингов")
-    fig, ax = plt.subplots()
-    sns.histplot(df["rating"], bins=20, kde=True, ax=ax)
-    st.pyplot(fig)
+    st.image(render_rating_hist_png(df), width="stretch")
 
     st.subheader("Распределение количества страниц")
-    fig, ax = plt.subplots()
-    sns.histplot(df["pages"].dropna(), bins=20, ax=ax)
-    st.pyplot(fig)
+    st.image(render_pages_hist_png(df), width="stretch")
 
 elif page == "Тренды":
     st.header("Тренды и закономерности")
 
     st.subheader("Корреляционная матрица")
-    corr_df = df[["rating", "pages", "ratings_count", "n_genres"]].corr()
-    fig, ax = plt.subplots()
-    sns.heatmap(corr_df, annot=True, cmap="coolwarm", fmt=".2f", ax=ax)
-    st.pyplot(fig)
+    st.image(render_corr_heatmap_png(df), width="stretch")
 
     st.subheader("Топ авторов по среднему рейтингу (≥ 3 книги)")
-    author_stats = (
-        df.groupby("author")
-        .agg(n_books=("title", "count"), avg_rating=("rating", "mean"))
-        .query("n_books >= 3")
-        .sort_values("avg_rating", ascending=False)
-        .head(15)
-    )
+    author_stats = author_leaderboard(df)
     st.bar_chart(author_stats["avg_rating"])
 
 elif page == "Выводы":
@@ -1,17 +1,21 @@
+import argparse
+import asyncio
 import csv
 import logging
+import math
 import os
 import sys
 from pathlib import Path
-from typing import Optional, Union
 
+import diskcache
+import httpx
+import pandas as pd
 import yaml
 from dotenv import load_dotenv
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
+from playwright.async_api import Browser, BrowserContext, Page, Route
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright
+from selectolax.lexbor import LexborHTMLParser
 
 
 load_dotenv()
@@ -37,9 +41,19 @@ RATING_META_SELECTOR: str = CONFIG["selectors"]["rating_meta"]
 SHOW_MORE_XPATH: str = CONFIG["selectors"]["show_more"]
 TAG_P: str = CONFIG["selectors"]["tag_p"]
 BOOK_LINK_SELECTOR: str = CONFIG["selectors"]["book_link"]
+BOOKS_PER_PAGE: int = CONFIG["pagination"]["books_per_page"]
+LIST_PAGE_RETRIES: int = CONFIG["pagination"]["retries"]
 USER_AGENT: str = CONFIG["headers"]["user_agent"]
+BLOCKED_RESOURCE_TYPES: frozenset[str] = frozenset(
+    CONFIG["blocked"]["resource_types"]
+)
+BLOCKED_URL_PATTERNS: tuple[str, ...] = tuple(CONFIG["blocked"]["url_patterns"])
 CSV_FIELDNAMES: list[str] = CONFIG["output"]["fieldnames"]
 OUTPUT_CSV_PATH: str = CONFIG["output"]["csv_path"]
+PARQUET_PATH: str = CONFIG["output"]["parquet_path"]
+CACHE_PATH: str = CONFIG["output"]["cache_path"]
+MAX_CONCURRENCY: int = int(os.environ.get("MAX_CONCURRENCY", 8))
+MAX_BOOKS: int = 150
 
 logging.basicConfig(
     level=logging.INFO,
@@ -48,84 +62,95 @@ logging.basicConfig(
 )
 logger = logging.getLogger("goodreads-scraper")
 
+SCROLL_UNTIL_SETTLED_JS: str = """
+() => new Promise((resolve) => {
+    let last = 0, same = 0, ticks = 0;
+    const timer = setInterval(() => {
+        window.scrollTo(0, document.body.scrollHeight);
+        const height = document.body.scrollHeight;
+        same = height === last ? same + 1 : 0;
+        last = height;
+        if (same >= 3 || ++ticks >= 40) {
+            clearInterval(timer);
+            resolve();
+        }
+    }, 150);
+})
+"""
+EXTRACT_BOOK_JS: str = """
+(s) => {
+    const text = (el) => el?.innerText.trim();
+    const texts = (sel) =>
+        [...document.querySelectorAll(sel)].map(text).filter(Boolean);
+    const pages = () => {
+        for (const p of document.querySelectorAll(s.tagP)) {
+            const t = p.innerText.trim().toLowerCase();
+            if (t.includes("pages")) return t;
+        }
+        return null;
+    };
+    return {
+        title: text(document.querySelector(s.title)),
+        genres: texts(s.genre),
+        authors: texts(s.author),
+        rating: text(document.querySelector(s.rating)),
+        ratingMeta: text(document.querySelector(s.ratingMeta)),
+        pages: pages(),
+    };
+}
+"""
+EXTRACT_BOOK_SELECTORS: dict[str, str] = {
+    "title": BOOK_PAGE_SELECTOR,
+    "genre": GENRE_SELECTOR,
+    "author": AUTHOR_SELECTOR,
+    "rating": RATING_SELECTOR,
+    "ratingMeta": RATING_META_SELECTOR,
+    "tagP": TAG_P,
+}
+
+
+async def block_assets(route: Route) -> None:
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+        pattern in request.url for pattern in BLOCKED_URL_PATTERNS
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
 
-def init_driver(headless: bool = True) -> webdriver.Chrome:
-    options = webdriver.ChromeOptions()
-
-    if headless:
-        options.add_argument("--headless=new")
-
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument(f"user-agent={USER_AGENT}")
-    return webdriver.Chrome(options=options)
-
-
-def safe_get_text(
-    driver: webdriver.Chrome,
-    by: By,
-    selector: str,
-    attr: str = "text",
-    multiple: bool = False,
-) -> Union[Optional[str], list[str]]:
 
-    if multiple:
-        elements = driver.find_elements(by, selector)
-    else:
-        elements = [driver.find_element(by, selector)]
+async def make_context(browser: Browser) -> BrowserContext:
+    context = await browser.new_context(
+        user_agent=USER_AGENT,
+        viewport={"width": 1920, "height": 1080},
+    )
+    await context.route("**/*", block_assets)
+    return context
 
-    if attr == "text":
-        if multiple:
-            return [el.text.strip() for el in elements if el.text.strip()]
-        else:
-            return elements[0].text.strip()
 
-    if multiple:
-        return [el.get_attribute(attr) for el in elements if el.get_attribute(attr)]
-    return elements[0].get_attribute(attr)
+async def wait_scroll_and_expand(page: Page) -> None:
+    await page.wait_for_selector(BOOK_PAGE_SELECTOR, timeout=10_000)
+    await page.evaluate(SCROLL_UNTIL_SETTLED_JS)
 
+    more_buttons = page.locator(f"xpath={SHOW_MORE_XPATH}")
+    if await more_buttons.count():
+        await more_buttons.first.evaluate("button => button.click()")
 
-def wait_scroll_and_expand(driver: webdriver.Chrome) -> None:
-    WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, BOOK_PAGE_SELECTOR))
-    )
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-    WebDriverWait(driver, 5).until(
-        lambda d: d.execute_script("return document.readyState") == "complete"
-    )
 
+async def get_goodreads_book_data(page: Page, url: str) -> dict:
     try:
-        more_button = WebDriverWait(driver, 3).until(
-            EC.element_to_be_clickable((By.XPATH, SHOW_MORE_XPATH))
-        )
-        driver.execute_script("arguments[0].click();", more_button)
+        await page.goto(url)
+        await wait_scroll_and_expand(page)
 
-    except Exception as error:
-        logger.warning(f"Не удалось развернуть список жанров: {str(error)}")
+        data = await page.evaluate(EXTRACT_BOOK_JS, EXTRACT_BOOK_SELECTORS)
 
-
-def get_goodreads_book_data(driver: webdriver.Chrome, url: str) -> dict:
-    try:
-        driver.get(url)
-        wait_scroll_and_expand(driver)
-
-        genres = safe_get_text(driver, By.CSS_SELECTOR, GENRE_SELECTOR, multiple=True)
-        title = safe_get_text(driver, By.CSS_SELECTOR, BOOK_PAGE_SELECTOR)
-        authors = safe_get_text(driver, By.CSS_SELECTOR, AUTHOR_SELECTOR, multiple=True)
-        author = ", ".join(authors)
-        rating = float(safe_get_text(driver, By.CSS_SELECTOR, RATING_SELECTOR))
-        rating_text = safe_get_text(driver, By.CSS_SELECTOR, RATING_META_SELECTOR)
+        title = data["title"]
+        genres = data["genres"]
+        author = ", ".join(data["authors"])
+        rating = float(data["rating"])
+        rating_text = data["ratingMeta"]
         ratings_count = int(rating_text.split("ratings")[0].strip().replace(",", ""))
-
-        pages = None
-        p_tags = driver.find_elements(By.TAG_NAME, TAG_P)
-        for p in p_tags:
-            text = p.text.strip().lower()
-            if "pages" in text:
-                pages = int(text.split()[0])
-                break
+        pages = int(data["pages"].split()[0]) if data["pages"] else None
 
         return {
             "title": title,
@@ -136,7 +161,7 @@ def get_goodreads_book_data(driver: webdriver.Chrome, url: str) -> dict:
             "ratings_count": ratings_count,
         }
 
-    except TimeoutException as error:
+    except PlaywrightTimeoutError as error:
         logger.warning(f"Timeout при загрузке {url}: {error}")
         return {}
 
@@ -145,65 +170,164 @@ def get_goodreads_book_data(driver: webdriver.Chrome, url: str) -> dict:
         return {}
 
 
-def get_top_goodreads_book_ids(
-    driver: webdriver.Chrome, max_books: int = 100
-) -> list[int]:
-    book_ids: list[int] = []
-    page: int = 1
+async def fetch(
+    context: BrowserContext,
+    semaphore: asyncio.Semaphore,
+    cache: diskcache.Cache,
+    book_id: int,
+) -> None:
+    url = BOOK_DETAILS_URL.format(book_id=book_id)
+
+    async with semaphore:
+        logger.info(f"Обрабатываем: {url}")
+        try:
+            page = await context.new_page()
+            try:
+                info = await get_goodreads_book_data(page, url)
+            finally:
+                await page.close()
+
+        except Exception as error:
+            logger.warning(f"Ошибка при обработке {url}: {error}")
+            return
+
+    if info:
+        cache[book_id] = info
+    else:
+        logger.warning(f"Книга {book_id} не получена, повторим при следующем запуске")
 
-    while len(book_ids) < max_books:
-        driver.get(f"{BOOKS_URL}?page={page}")
-        WebDriverWait(driver, 10).until(
-            lambda d: d.execute_script("return document.readyState") == "complete"
-        )
 
-        links = driver.find_elements(By.CSS_SELECTOR, BOOK_LINK_SELECTOR)
+async def get_list_page(client: httpx.AsyncClient, page: int) -> str:
+    for attempt in range(1, LIST_PAGE_RETRIES + 1):
+        try:
+            response = await client.get(f"{BOOKS_URL}?page={page}")
+            response.raise_for_status()
+            return response.text
 
-        for link in links:
-            href = link.get_attribute("href")
-            if "/book/show/" in href:
-                book_id_part = href.split("/book/show/")[1].split(".")[0]
-                if book_id_part.isdigit() and int(book_id_part) not in book_ids:
-                    book_ids.append(int(book_id_part))
-                    if len(book_ids) >= max_books:
-                        break
+        except httpx.HTTPError as error:
+            logger.warning(
+                f"Страница {page}, попытка {attempt}/{LIST_PAGE_RETRIES}: {error}"
+            )
+            if attempt < LIST_PAGE_RETRIES:
+                await asyncio.sleep(attempt)
 
-        logger.info(f"Страница {page} обработана, всего ID: {len(book_ids)}")
-        page += 1
+    raise RuntimeError(f"Не удалось загрузить страницу списка {page}")
 
-    return book_ids
 
+async def get_top_goodreads_book_ids(max_books: int = 100) -> list[int]:
+    book_ids: list[int] = []
+    seen: set[int] = set()
+    page: int = 1
 
-def main() -> None:
-    output_path: str = os.path.abspath(
-        os.path.join(os.path.dirname(__file__), "..", OUTPUT_CSV_PATH)
-    )
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    async with httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT}, http2=True, follow_redirects=True
+    ) as client:
+        while len(book_ids) < max_books:
+            found_before = len(book_ids)
+            needed_pages = math.ceil((max_books - len(book_ids)) / BOOKS_PER_PAGE)
+            pages = range(page, page + needed_pages)
+            texts = await asyncio.gather(*(get_list_page(client, p) for p in pages))
+
+            for p, text in zip(pages, texts):
+                for link in LexborHTMLParser(text).css(BOOK_LINK_SELECTOR):
+                    href = link.attributes.get("href") or ""
+                    if "/book/show/" in href:
+                        book_id_part = href.split("/book/show/")[1].split(".")[0]
+                        if not book_id_part.isdigit():
+                            continue
+                        book_id = int(book_id_part)
+                        if book_id not in seen:
+                            seen.add(book_id)
+                            book_ids.append(book_id)
+                            if len(book_ids) >= max_books:
+                                break
+
+                logger.info(f"Страница {p} обработана, всего ID: {len(book_ids)}")
+                if len(book_ids) >= max_books:
+                    break
+
+            page += needed_pages
+
+            if len(book_ids) == found_before:
+                break
 
-    logger.info(f"CSV-файл будет сохранён в: {output_path}")
+    if len(book_ids) < max_books:
+        raise RuntimeError(
+            f"Страницы списка не дали новых ID после страницы {page - 1}: "
+            f"получено {len(book_ids)} из {max_books}"
+        )
 
-    with open(output_path, mode="w", encoding="utf-8", newline="") as file:
-        writer = csv.DictWriter(file, fieldnames=CSV_FIELDNAMES)
-        writer.writeheader()
+    return book_ids
 
-        driver = init_driver(headless=True)
-        ids = get_top_goodreads_book_ids(driver, 150)
-        logger.info(f"Получено {len(ids)} книг")
 
-        for i, book_id in enumerate(ids, 1):
-            url = BOOK_DETAILS_URL.format(book_id=book_id)
-            logger.info(f"[{i}/{len(ids)}] Обрабатываем: {url}")
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сбор данных о книгах с Goodreads")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="очистить кэш и собрать все книги заново",
+    )
+    return parser.parse_args()
 
-            info = get_goodreads_book_data(driver, url)
-            if isinstance(info.get("genres"), list):
-                info["genres"] = ", ".join(info["genres"])
 
-            writer.writerow(info)
-            file.flush()
-            logger.info(f"Книга '{info.get('title')}' добавлена в CSV")
+async def main(force: bool = False) -> None:
+    root: str = os.path.join(os.path.dirname(__file__), "..")
+    output_path: str = os.path.abspath(os.path.join(root, OUTPUT_CSV_PATH))
+    parquet_path: str = os.path.abspath(os.path.join(root, PARQUET_PATH))
+    cache_path: str = os.path.abspath(os.path.join(root, CACHE_PATH))
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    logger.info(f"CSV-файл будет сохранён в: {output_path}")
 
-        driver.quit()
+    with diskcache.Cache(cache_path) as cache:
+        try:
+            ids = await get_top_goodreads_book_ids(MAX_BOOKS)
+        except (RuntimeError, httpx.HTTPError) as error:
+            logger.error(f"Список книг не получен, файлы данных не изменены: {error}")
+            sys.exit(1)
+
+        if force:
+            cache.clear()
+            logger.info("Кэш очищен")
+
+        pending = [book_id for book_id in ids if book_id not in cache]
+        logger.info(f"Получено {len(ids)} книг, из них новых: {len(pending)}")
+
+        if pending:
+            async with async_playwright() as p:
+                browser = await p.chromium.launch(headless=True)
+                try:
+                    context = await make_context(browser)
+
+                    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+                    await asyncio.gather(
+                        *(
+                            fetch(context, semaphore, cache, book_id)
+                            for book_id in pending
+                        )
+                    )
+                finally:
+                    await browser.close()
+
+        books = [cache[book_id] for book_id in ids if book_id in cache]
+        logger.info(f"Собрано {len(books)} из {len(ids)} книг")
+
+        if len(ids) < MAX_BOOKS or not books:
+            logger.error("Недостаточно данных, файлы данных не изменены")
+            sys.exit(1)
+
+        with open(output_path, mode="w", encoding="utf-8", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=CSV_FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(
+                {**info, "genres": ", ".join(info["genres"])} for info in books
+            )
+
+        pd.DataFrame(books, columns=CSV_FIELDNAMES).to_parquet(
+            parquet_path, compression="zstd"
+        )
+        logger.info(f"Parquet-файл сохранён в: {parquet_path}")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main(force=parse_args().force))